@@ -0,0 +1,75 @@
+"""Mesure du temps de rendu du catalogue pour 5 000 livres.
+
+Utilise une base SQLite en mémoire : aucun serveur MySQL n'est nécessaire.
+    python bench_catalogue.py
+"""
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from jinja2 import FileSystemBytecodeCache
+
+from main import app, db, Livre, User, cache_cartes
+
+NOMBRE_LIVRES = 5000
+REPETITIONS = 5
+CATEGORIES = ['Littérature', 'Sciences', 'Histoire', 'Fantasy', 'Science-Fiction', 'Philosophie']
+
+
+def preparer_base():
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Livre(
+                titre=f'Livre {i}', auteur=f'Auteur {i % 300}', isbn=f'{9780000000000 + i}',
+                annee_publication=1950 + i % 70, categorie=CATEGORIES[i % len(CATEGORIES)],
+                resume='Résumé ' * 20, disponible=i % 3 != 0,
+                image_couverture='etranger.jpg' if i % 2 else None
+            )
+            for i in range(NOMBRE_LIVRES)
+        ])
+        utilisateur = User(username='lecteur', email='lecteur@example.com')
+        utilisateur.set_password('lecteur')
+        db.session.add(utilisateur)
+        db.session.commit()
+        return utilisateur.id
+
+
+def chronometrer(client, repetitions=REPETITIONS):
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        reponse = client.get('/catalogue')
+        assert reponse.status_code == 200
+    return (time.perf_counter() - debut) / repetitions * 1000
+
+
+def bench_rendu(utilisateur_id):
+    client = app.test_client()
+    cache_cartes.clear()
+    print(f"Catalogue, cache des cartes vide   : {chronometrer(client, 1):.0f} ms")
+    print(f"Catalogue, cache des cartes rempli : {chronometrer(client):.0f} ms")
+
+    with client.session_transaction() as session:
+        session['_user_id'] = str(utilisateur_id)
+        session['_fresh'] = True
+    print(f"Catalogue, utilisateur connecté    : {chronometrer(client):.0f} ms")
+
+
+def bench_demarrage_a_froid():
+    # Compilation des templates sans puis avec le cache de bytecode (déjà alimenté ci-dessus)
+    noms = ['catalogue.html', 'carte_livre.html', 'emprunts.html', 'statistiques.html']
+    for libelle, cache in (('sans cache de bytecode', None), ('avec cache de bytecode', FileSystemBytecodeCache())):
+        app.jinja_env.bytecode_cache = cache
+        for nom in noms:
+            app.jinja_env.get_template(nom)
+        app.jinja_env.cache.clear()
+        debut = time.perf_counter()
+        for nom in noms:
+            app.jinja_env.get_template(nom)
+        print(f"Chargement des templates, {libelle} : {(time.perf_counter() - debut) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    bench_rendu(preparer_base())
+    bench_demarrage_a_froid()
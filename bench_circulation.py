@@ -0,0 +1,87 @@
+"""Compare 500 emprunts puis 500 retours : une requête par livre contre un seul lot JSON.
+
+Utilise une base SQLite en mémoire : aucun serveur MySQL n'est nécessaire.
+    python bench_circulation.py
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from main import app, db, Livre, Adherent, Emprunt, User
+
+TAILLE_LOT = 500
+
+
+def preparer_base():
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', role='admin')
+        admin.set_password('admin')
+        db.session.add(admin)
+        db.session.add_all([
+            Adherent(nom=f'Nom {i}', prenom=f'Prénom {i}', email=f'adherent{i}@example.com', classe=f'{i % 7}A')
+            for i in range(50)
+        ])
+        db.session.add_all([
+            Livre(titre=f'Livre {i}', auteur=f'Auteur {i}', isbn=f'{9780000000000 + i}', categorie='Sciences')
+            for i in range(2 * TAILLE_LOT)
+        ])
+        db.session.commit()
+        return admin.id
+
+
+def client_admin(admin_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
+
+
+def par_requete(client, livre_ids):
+    date_retour = (datetime.utcnow() + timedelta(days=14)).strftime('%Y-%m-%d')
+    debut = time.perf_counter()
+    for i, livre_id in enumerate(livre_ids):
+        reponse = client.post('/dashboard/emprunts', data={
+            'adherent_id': i % 50 + 1, 'livre_id': livre_id, 'date_retour': date_retour
+        })
+        assert reponse.status_code == 302
+    duree_emprunts = time.perf_counter() - debut
+
+    with app.app_context():
+        emprunt_ids = [e.id for e in Emprunt.query.filter(
+            Emprunt.livre_id.in_(livre_ids), Emprunt.date_retour_effective.is_(None))]
+    debut = time.perf_counter()
+    for emprunt_id in emprunt_ids:
+        assert client.get(f'/dashboard/emprunts/retour/{emprunt_id}').status_code == 302
+    return duree_emprunts, time.perf_counter() - debut
+
+
+def par_lot(client, livre_ids):
+    debut = time.perf_counter()
+    reponse = client.post('/api/circulation/lot', json={
+        'emprunts': [{'adherent_id': i % 50 + 1, 'isbn': f'{9780000000000 + livre_id - 1}'}
+                     for i, livre_id in enumerate(livre_ids)]
+    })
+    assert all(r['ok'] for r in reponse.json['emprunts'])
+    duree_emprunts = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    reponse = client.post('/api/circulation/lot', json={'retours': [{'livre_id': i} for i in livre_ids]})
+    assert all(r['ok'] for r in reponse.json['retours'])
+    return duree_emprunts, time.perf_counter() - debut
+
+
+if __name__ == '__main__':
+    client = client_admin(preparer_base())
+    requetes = par_requete(client, list(range(1, TAILLE_LOT + 1)))
+    lot = par_lot(client, list(range(TAILLE_LOT + 1, 2 * TAILLE_LOT + 1)))
+
+    for libelle, (emprunts, retours) in (('Une requête par livre', requetes), ('Lot JSON', lot)):
+        print(f"{libelle:22}: {TAILLE_LOT} emprunts en {emprunts * 1000:.0f} ms, "
+              f"{TAILLE_LOT} retours en {retours * 1000:.0f} ms")
+
+    with app.app_context():
+        assert Livre.query.filter_by(disponible=True).count() == 2 * TAILLE_LOT
@@ -1,11 +1,39 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, send_file
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import os
+import csv
+import io
+import tempfile
+import time
+import sqlite3
+import threading
+import bisect
+import unicodedata
+from functools import wraps, lru_cache
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from werkzeug.utils import secure_filename
 from flask_migrate import Migrate
+from sqlalchemy.exc import IntegrityError
+from jinja2 import FileSystemBytecodeCache
+
+# pyarrow est optionnel : sans lui, l'export Parquet est désactivé (CSV uniquement)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# pypdf est optionnel : sans lui, le contenu des PDF n'est pas indexé
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
 
 app = Flask(__name__)
 login_manager = LoginManager()
@@ -13,10 +41,15 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Configuration de la base de données
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://root:@localhost/bibliotheque'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'mysql://root:@localhost/bibliotheque')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'votre_cle_secrete'
 
+# Statistiques : marge relue à chaque passage (doit dépasser la durée d'une transaction)
+# et ancienneté au-delà de laquelle la page des statistiques relance le traitement
+app.config['STATS_MARGE'] = timedelta(minutes=10)
+app.config['STATS_INTERVALLE'] = timedelta(minutes=15)
+
 # Configuration des uploads
 UPLOAD_FOLDER = "static/livres/"
 COUVERTURE_FOLDER = "static/images/couvertures/"
@@ -27,10 +60,168 @@ app.config['COUVERTURE_FOLDER'] = COUVERTURE_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(COUVERTURE_FOLDER, exist_ok=True)
 
+# Cache du bytecode des templates compilés (accélère les démarrages à froid).
+# Dossier par défaut de Jinja : propre à l'utilisateur système, en 0700, propriétaire vérifié
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 # Initialisation de SQLAlchemy
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+# Limitation de débit (token bucket)
+# "memory" : propre à chaque processus ; "sqlite" : partagé entre les workers d'une même machine
+app.config['RATELIMIT_BACKEND'] = os.environ.get('RATELIMIT_BACKEND', 'memory')
+# Fichier dans le dossier instance de l'application, pas dans le /tmp partagé
+app.config['RATELIMIT_SQLITE_PATH'] = os.environ.get(
+    'RATELIMIT_SQLITE_PATH', os.path.join(app.instance_path, 'ratelimit.db'))
+# (capacité, jetons rechargés par seconde)
+app.config['RATELIMIT_REGLES'] = {
+    'connexion_ip': (20, 20 / 60),
+    'connexion_utilisateur': (5, 5 / 60),
+    'inscription_ip': (5, 5 / 3600),
+    'emprunt_ip': (30, 30 / 60),
+    'emprunt_utilisateur': (10, 10 / 60),
+}
+
+
+class MemoireTokenBucket:
+    """Seaux en mémoire du processus, sans verrou.
+
+    Chaque seau est un tuple (jetons, horodatage) remplacé d'un seul coup dans le dict ;
+    sous forte concurrence entre threads, quelques requêtes de plus peuvent passer.
+    Au-delà de max_seaux, les seaux les moins récemment utilisés sont retirés
+    (au plus quelques-uns par appel : le coût reste constant quel que soit le nombre de clés).
+    """
+
+    def __init__(self, max_seaux=100000):
+        self.seaux = OrderedDict()
+        self.max_seaux = max_seaux
+
+    def consommer(self, cle, capacite, debit):
+        maintenant = time.monotonic()
+        jetons, dernier = self.seaux.get(cle, (capacite, maintenant))
+        jetons = min(capacite, jetons + (maintenant - dernier) * debit)
+        autorise = jetons >= 1
+        self._enregistrer(cle, (jetons - 1 if autorise else jetons, maintenant))
+        return autorise, 0 if autorise else (1 - jetons) / debit
+
+    def _enregistrer(self, cle, seau):
+        self.seaux[cle] = seau
+        try:
+            self.seaux.move_to_end(cle)
+        except KeyError:
+            # Retiré entre-temps par un autre thread : le seau repartira plein
+            pass
+        for _ in range(4):
+            if len(self.seaux) <= self.max_seaux:
+                break
+            try:
+                self.seaux.popitem(last=False)
+            except KeyError:
+                break
+
+
+class SqliteTokenBucket:
+    """Seaux stockés dans un fichier SQLite local, partagés entre les workers.
+
+    Tous les purge_tous_les appels, les seaux inactifs depuis plus de duree_inactivite
+    secondes (donc forcément pleins) sont supprimés.
+    """
+
+    def __init__(self, chemin, duree_inactivite=3600, purge_tous_les=1000):
+        self.chemin = chemin
+        self.local = threading.local()
+        self.duree_inactivite = duree_inactivite
+        self.purge_tous_les = purge_tous_les
+        self.appels = 0
+
+    def _connexion(self):
+        connexion = getattr(self.local, 'connexion', None)
+        if connexion is None:
+            connexion = sqlite3.connect(self.chemin, timeout=1, isolation_level=None)
+            connexion.execute('PRAGMA journal_mode=WAL')
+            connexion.execute('CREATE TABLE IF NOT EXISTS seau '
+                              '(cle TEXT PRIMARY KEY, jetons REAL NOT NULL, dernier REAL NOT NULL)')
+            connexion.execute('CREATE INDEX IF NOT EXISTS ix_seau_dernier ON seau (dernier)')
+            self.local.connexion = connexion
+        return connexion
+
+    def consommer(self, cle, capacite, debit):
+        # time.time() et non monotonic() : l'horloge doit être commune aux processus
+        maintenant = time.time()
+        try:
+            connexion = self._connexion()
+            connexion.execute('BEGIN IMMEDIATE')
+            ligne = connexion.execute('SELECT jetons, dernier FROM seau WHERE cle = ?', (cle,)).fetchone()
+            jetons, dernier = ligne if ligne else (capacite, maintenant)
+            jetons = min(capacite, jetons + max(0, maintenant - dernier) * debit)
+            autorise = jetons >= 1
+            if autorise:
+                jetons -= 1
+            connexion.execute('INSERT OR REPLACE INTO seau (cle, jetons, dernier) VALUES (?, ?, ?)',
+                              (cle, jetons, maintenant))
+            self.appels += 1
+            if self.appels % self.purge_tous_les == 0:
+                connexion.execute('DELETE FROM seau WHERE dernier < ?', (maintenant - self.duree_inactivite,))
+            connexion.execute('COMMIT')
+        except sqlite3.Error as e:
+            connexion = getattr(self.local, 'connexion', None)
+            if connexion is not None and connexion.in_transaction:
+                connexion.execute('ROLLBACK')
+            # En cas d'indisponibilité du fichier, on laisse passer plutôt que de bloquer le service
+            app.logger.warning("Limitation de débit désactivée pour cette requête (%s) : %s", self.chemin, e)
+            return True, 0
+        return autorise, 0 if autorise else (1 - jetons) / debit
+
+
+if app.config['RATELIMIT_BACKEND'] == 'sqlite':
+    os.makedirs(os.path.dirname(app.config['RATELIMIT_SQLITE_PATH']) or '.', exist_ok=True)
+    # Durée au bout de laquelle le seau le plus lent est de nouveau plein
+    limiteur = SqliteTokenBucket(
+        app.config['RATELIMIT_SQLITE_PATH'],
+        duree_inactivite=max(capacite / debit for capacite, debit in app.config['RATELIMIT_REGLES'].values())
+    )
+else:
+    limiteur = MemoireTokenBucket()
+
+
+def limite_debit(*regles):
+    """Refuse la requête (429) avant toute requête SQL ou calcul de hash si un seau est vide.
+
+    Chaque règle est un couple (nom de règle, fonction renvoyant l'identifiant à limiter
+    ou None pour ignorer la règle). Seules les requêtes POST sont comptées.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def wrapper(*args, **kwargs):
+            if request.method == 'POST':
+                for nom, identifiant in regles:
+                    valeur = identifiant()
+                    if not valeur:
+                        continue
+                    capacite, debit = app.config['RATELIMIT_REGLES'][nom]
+                    autorise, attente = limiteur.consommer(f"{nom}:{valeur}", capacite, debit)
+                    if not autorise:
+                        return "Trop de requêtes, réessayez plus tard", 429, {
+                            'Retry-After': str(int(attente) + 1)
+                        }
+            return vue(*args, **kwargs)
+        return wrapper
+    return decorateur
+
+
+def _ip_client():
+    return request.remote_addr
+
+
+def _nom_utilisateur_formulaire():
+    return (request.form.get('username') or '').strip().lower()
+
+
+def _utilisateur_session():
+    # Identifiant lu dans la session Flask-Login : pas de chargement de l'utilisateur en base
+    return session.get('_user_id')
+
 
 # User loader pour Flask-Login
 @login_manager.user_loader
@@ -79,6 +270,8 @@ class Livre(db.Model):
     contenu_pdf = db.Column(db.String(255))
     image_couverture = db.Column(db.String(255))  # Nouveau champ pour l'image
     disponible = db.Column(db.Boolean, default=True)
+    # Incrémentée par la base à chaque UPDATE ; sert de clé au cache des cartes du catalogue
+    version = db.Column(db.Integer, nullable=False, default=1, onupdate=db.literal_column('version') + 1)
     emprunts = db.relationship('Emprunt', backref='livre', lazy=True)
 
 class Emprunt(db.Model):
@@ -92,6 +285,41 @@ class Emprunt(db.Model):
     prolongations = db.Column(db.Integer, default=0)
     amende = db.Column(db.Float, default=0.0)
 
+# Texte extrait des PDF, page par page (alimenté par indexer_pdf)
+class PagePdf(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('livre_id', 'page', name='uq_page_pdf'),
+        db.Index('ix_page_pdf_texte', 'texte', mysql_prefix='FULLTEXT'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    livre_id = db.Column(db.Integer, db.ForeignKey('livre.id'), nullable=False, index=True)
+    page = db.Column(db.Integer, nullable=False)
+    texte = db.Column(db.Text)
+    livre = db.relationship('Livre', backref=db.backref('pages_pdf', lazy='dynamic'))
+
+# Agrégats journaliers des emprunts (alimentés par mettre_a_jour_statistiques)
+class StatEmpruntJour(db.Model):
+    __table_args__ = (db.UniqueConstraint('jour', 'categorie', 'classe', name='uq_stat_jour'),)
+    id = db.Column(db.Integer, primary_key=True)
+    jour = db.Column(db.Date, nullable=False, index=True)
+    categorie = db.Column(db.String(50), nullable=False, default='')
+    classe = db.Column(db.String(50), nullable=False, default='')
+    emprunts = db.Column(db.Integer, nullable=False, default=0)
+    retours = db.Column(db.Integer, nullable=False, default=0)
+    retours_en_retard = db.Column(db.Integer, nullable=False, default=0)
+
+# Position du dernier traitement incrémental des statistiques
+class StatWatermark(db.Model):
+    nom = db.Column(db.String(50), primary_key=True)
+    dernier_passage = db.Column(db.DateTime, nullable=False, default=datetime(1970, 1, 1))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Emprunts et retours déjà comptés dans la fenêtre relue à chaque passage
+class StatLigneComptee(db.Model):
+    type = db.Column(db.String(10), primary_key=True)  # 'emprunt' ou 'retour'
+    emprunt_id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.DateTime, nullable=False, index=True)
+
 # Route pour créer un admin (à retirer en production)
 @app.route('/setup/admin', methods=['GET', 'POST'])
 def setup_admin():
@@ -160,7 +388,7 @@ def catalogue():
             adherent_id=current_user.id,
             date_retour_effective=None
         ).all()
-        livres_empruntes = [emp.livre_id for emp in emprunts_utilisateur]
+        livres_empruntes = {emp.livre_id for emp in emprunts_utilisateur}
     
     return render_template(
         "catalogue.html", 
@@ -173,8 +401,281 @@ def catalogue():
         recherche_term=recherche
     )
 
+# FRAGMENTS DE TEMPLATES EN CACHE
+MAX_CARTES_EN_CACHE = 20000
+cache_cartes = {}
+
+
+@app.template_global()
+def carte_livre(livre):
+    """Début et fin HTML de la carte d'un livre, mis en cache par (id, version).
+
+    Les boutons propres à l'utilisateur connecté sont rendus entre les deux,
+    hors du cache.
+    """
+    cle = (livre.id, livre.version)
+    carte = cache_cartes.get(cle)
+    if carte is None:
+        module = app.jinja_env.get_template('carte_livre.html').module
+        carte = {'debut': module.debut_carte(livre), 'fin': module.fin_carte(livre)}
+        if len(cache_cartes) >= MAX_CARTES_EN_CACHE:
+            cache_cartes.clear()
+        cache_cartes[cle] = carte
+    return carte
+
+
+@lru_cache(maxsize=4096)
+def _formater_jour(jour):
+    return jour.strftime('%d/%m/%Y')
+
+
+@app.template_filter('date_fr')
+def date_fr(valeur):
+    if valeur is None:
+        return ''
+    # Mise en cache par jour : les lignes d'une même journée partagent le résultat
+    return _formater_jour(valeur.date() if isinstance(valeur, datetime) else valeur)
+
+
+# SUGGESTIONS DE RECHERCHE - INDEX DE PRÉFIXES EN MÉMOIRE
+def normaliser(texte):
+    """Minuscules, sans accents ni espaces superflus."""
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return ' '.join(texte.lower().split())
+
+
+class IndexSuggestions:
+    """Tableau trié de (clé normalisée, id du livre) interrogé par bisect.
+
+    Chaque livre est indexé sur son titre, son auteur et son ISBN complets
+    ainsi que sur chaque mot du titre et de l'auteur. Chaque worker a son propre
+    index : les livres ajoutés ailleurs (id supérieur au dernier indexé) sont lus
+    en base au plus tard intervalle secondes après leur ajout.
+    """
+
+    def __init__(self, intervalle=5):
+        self.cles = []
+        self.livres = {}
+        self.dernier_id = 0
+        self.construit = False
+        self.intervalle = intervalle
+        self.derniere_maj = 0
+        self.verrou = threading.Lock()
+
+    @staticmethod
+    def _cles_livre(livre):
+        cles = set()
+        for champ in (livre.titre, livre.auteur):
+            texte = normaliser(champ)
+            if texte:
+                cles.add(texte)
+                cles.update(texte.split())
+        if livre.isbn:
+            cles.add(normaliser(livre.isbn))
+        return cles
+
+    def _indexer(self, livre):
+        # À appeler sous self.verrou
+        if livre.id in self.livres:
+            return
+        self.livres[livre.id] = {'id': livre.id, 'titre': livre.titre, 'auteur': livre.auteur, 'isbn': livre.isbn}
+        for cle in self._cles_livre(livre):
+            bisect.insort(self.cles, (cle, livre.id))
+
+    def _charger_nouveaux(self):
+        # À appeler sous self.verrou ; dernier_id n'avance qu'ici, d'après ce qui a été lu en base
+        for livre in Livre.query.filter(Livre.id > self.dernier_id).order_by(Livre.id).all():
+            self._indexer(livre)
+            self.dernier_id = livre.id
+        self.derniere_maj = time.monotonic()
+
+    def construire(self):
+        with self.verrou:
+            if self.construit:
+                return
+            cles = []
+            livres = {}
+            for livre in Livre.query.all():
+                livres[livre.id] = {'id': livre.id, 'titre': livre.titre, 'auteur': livre.auteur, 'isbn': livre.isbn}
+                cles.extend((cle, livre.id) for cle in self._cles_livre(livre))
+            cles.sort()
+            self.cles = cles
+            self.livres = livres
+            self.dernier_id = max(livres, default=0)
+            self.derniere_maj = time.monotonic()
+            self.construit = True
+
+    def rafraichir(self):
+        """Ajoute les livres créés depuis le dernier passage (par ce worker ou un autre)."""
+        with self.verrou:
+            if time.monotonic() - self.derniere_maj < self.intervalle:
+                return
+            self._charger_nouveaux()
+
+    def ajouter(self, livre):
+        with self.verrou:
+            # Avant la première construction, le livre sera lu en base avec les autres.
+            # Sinon on relit tous les livres récents : ceux ajoutés par d'autres workers
+            # avant celui-ci ne doivent pas être sautés.
+            if self.construit:
+                self._charger_nouveaux()
+                self._indexer(livre)
+
+    def chercher(self, prefixe, limite=8):
+        if not self.construit:
+            self.construire()
+        elif time.monotonic() - self.derniere_maj >= self.intervalle:
+            self.rafraichir()
+        prefixe = normaliser(prefixe)
+        if not prefixe:
+            return []
+        cles = self.cles
+        resultats = []
+        vus = set()
+        position = bisect.bisect_left(cles, (prefixe,))
+        while position < len(cles) and len(resultats) < limite:
+            cle, livre_id = cles[position]
+            if not cle.startswith(prefixe):
+                break
+            if livre_id not in vus:
+                vus.add(livre_id)
+                resultats.append(self.livres[livre_id])
+            position += 1
+        return resultats
+
+
+index_suggestions = IndexSuggestions()
+
+
+@app.route("/api/suggest")
+def suggest():
+    return jsonify(index_suggestions.chercher(request.args.get('q', '')))
+
+# CONTENU DES PDF - EXTRACTION EN ARRIÈRE-PLAN ET RECHERCHE PAR PAGE
+def _pages_deja_indexees(livre_id):
+    return db.session.query(db.func.max(PagePdf.page)) \
+        .filter(PagePdf.livre_id == livre_id).scalar() or 0
+
+
+def indexer_pdf(livre_id, chemin, taille_lot=20):
+    """Extrait le texte du PDF page par page et l'enregistre par lots.
+
+    Le fichier est lu à la demande depuis le disque, et un nouveau lecteur est créé
+    pour chaque lot afin de libérer les objets déjà résolus : la mémoire utilisée ne
+    dépend pas de la taille du document. Reprend après la dernière page déjà indexée.
+    """
+    if PdfReader is None:
+        return 0
+    pages_ajoutees = 0
+    with app.app_context(), open(chemin, 'rb') as fichier:
+        nombre_pages = len(PdfReader(fichier).pages)
+        debut = _pages_deja_indexees(livre_id)
+        while debut < nombre_pages:
+            lecteur = PdfReader(fichier)
+            fin = min(debut + taille_lot, nombre_pages)
+            for numero in range(debut, fin):
+                try:
+                    texte = lecteur.pages[numero].extract_text() or ''
+                except Exception:
+                    texte = ''
+                db.session.add(PagePdf(livre_id=livre_id, page=numero + 1, texte=texte))
+            del lecteur
+            try:
+                db.session.commit()
+                pages_ajoutees += fin - debut
+                debut = fin
+            except IntegrityError:
+                # Un autre traitement (ex. flask indexer-pdf) a indexé ces pages entre-temps ;
+                # toute autre cause (livre supprimé...) ne fait pas avancer les pages : on abandonne
+                db.session.rollback()
+                deja_indexees = _pages_deja_indexees(livre_id)
+                if deja_indexees <= debut:
+                    raise
+                debut = deja_indexees
+        db.session.remove()
+    return pages_ajoutees
+
+
+pool_pdf = None
+
+
+def programmer_indexation_pdf(livre_id, nom_fichier):
+    """Envoie l'extraction au pool de processus sans attendre le résultat."""
+    global pool_pdf
+    if PdfReader is None or not nom_fichier:
+        return None
+    if pool_pdf is None:
+        # "spawn" : les workers démarrent d'un processus neuf (pas de fork d'un serveur multi-thread
+        # ni de connexions SQL héritées)
+        pool_pdf = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+    chemin = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], nom_fichier))
+    future = pool_pdf.submit(indexer_pdf, livre_id, chemin)
+    future.add_done_callback(_fin_indexation_pdf)
+    return future
+
+
+def _fin_indexation_pdf(future):
+    if future.exception() is not None:
+        app.logger.error("Échec de l'indexation PDF : %s", future.exception())
+
+
+@app.cli.command("indexer-pdf")
+def indexer_pdf_command():
+    """Indexe (ou termine d'indexer) le contenu de tous les PDF existants."""
+    if PdfReader is None:
+        print("pypdf n'est pas installé")
+        return
+    for livre in Livre.query.filter(Livre.contenu_pdf.isnot(None)).all():
+        chemin = os.path.join(app.config['UPLOAD_FOLDER'], livre.contenu_pdf)
+        if os.path.exists(chemin):
+            print(f"{livre.titre} : {indexer_pdf(livre.id, chemin)} page(s) indexée(s)")
+
+
+def _extrait(texte, terme, largeur=80):
+    texte = ' '.join(texte.split())
+    terme = normaliser(terme)
+    # Normalisation caractère par caractère en gardant la position d'origine :
+    # NFKD change la longueur du texte (ligatures "ﬁ", "ﬂ"... fréquentes dans les PDF)
+    normalise = []
+    origine = []
+    for index, caractere in enumerate(texte):
+        for c in unicodedata.normalize('NFKD', caractere).lower():
+            if not unicodedata.combining(c):
+                normalise.append(c)
+                origine.append(index)
+    position = ''.join(normalise).find(terme) if terme else -1
+    if position < 0:
+        return texte[:2 * largeur]
+    debut = max(0, origine[position] - largeur)
+    fin = origine[position + len(terme) - 1] + 1 + largeur
+    return ('…' if debut > 0 else '') + texte[debut:fin] + ('…' if fin < len(texte) else '')
+
+
+@app.route("/api/recherche_pdf")
+def recherche_pdf():
+    terme = request.args.get('q', '').strip()
+    if len(terme) < 2:
+        return jsonify([])
+
+    query = db.session.query(PagePdf.livre_id, Livre.titre, PagePdf.page, PagePdf.texte) \
+        .join(Livre, PagePdf.livre_id == Livre.id)
+    if db.engine.dialect.name == 'mysql':
+        query = query.filter(db.text("MATCH (page_pdf.texte) AGAINST (:terme IN NATURAL LANGUAGE MODE)")) \
+            .params(terme=terme)
+    else:
+        query = query.filter(PagePdf.texte.ilike(f'%{terme}%'))
+    pages = query.order_by(PagePdf.livre_id, PagePdf.page).limit(100).all()
+
+    resultats = {}
+    for livre_id, titre, page, texte in pages:
+        livre = resultats.setdefault(livre_id, {'livre_id': livre_id, 'titre': titre, 'pages': []})
+        livre['pages'].append({'page': page, 'extrait': _extrait(texte or '', terme)})
+    return jsonify(list(resultats.values()))
+
 # EMPRUNTER LIVRE - UNIQUEMENT POUR CONNECTÉS
 @app.route('/emprunter_livre/<int:livre_id>', methods=['POST'])
+@limite_debit(('emprunt_ip', _ip_client), ('emprunt_utilisateur', _utilisateur_session))
 @login_required
 def emprunter_livre(livre_id):
     livre = Livre.query.get_or_404(livre_id)
@@ -240,6 +741,7 @@ def contact():
     return render_template("contact.html", title="Contact")
 
 @app.route("/inscription", methods=['GET', 'POST'])
+@limite_debit(('inscription_ip', _ip_client))
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
@@ -275,6 +777,7 @@ def register():
     return render_template('register.html', title='Inscription')
 
 @app.route("/connexion", methods=['GET', 'POST'])
+@limite_debit(('connexion_ip', _ip_client), ('connexion_utilisateur', _nom_utilisateur_formulaire))
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('catalogue'))  # Rediriger vers catalogue si déjà connecté
@@ -378,7 +881,10 @@ def emprunts():
 
         return redirect(url_for('emprunts'))
 
-    emprunts_liste = Emprunt.query.all()
+    # Livre et adhérent chargés avec l'emprunt : pas de requête par ligne du tableau
+    emprunts_liste = Emprunt.query.options(
+        db.joinedload(Emprunt.livre), db.joinedload(Emprunt.adherent)
+    ).all()
     adherents_liste = Adherent.query.all()
     livres_disponibles = Livre.query.filter_by(disponible=True).all()
     reservations_liste = []
@@ -451,6 +957,8 @@ def livres():
         try:
             db.session.add(nouveau_livre)
             db.session.commit()
+            index_suggestions.ajouter(nouveau_livre)
+            programmer_indexation_pdf(nouveau_livre.id, fichier_pdf_nom)
             flash("Livre ajouté avec succès", "success")
         except Exception as e:
             db.session.rollback()
@@ -461,6 +969,150 @@ def livres():
     livres_liste = Livre.query.all()
     return render_template("livres.html", title="Livres", livres=livres_liste)
 
+# CIRCULATION - RETOURS ET EMPRUNTS PAR LOT (DOUCHETTE)
+MAX_ELEMENTS_LOT = 1000
+
+
+def _resoudre_livres(elements):
+    """Associe à chaque élément l'id du livre, donné directement ou via son ISBN (une seule requête)."""
+    isbns = {str(e['isbn']) for e in elements if isinstance(e, dict) and e.get('isbn') and not e.get('livre_id')}
+    par_isbn = dict(db.session.query(Livre.isbn, Livre.id).filter(Livre.isbn.in_(isbns)).all()) if isbns else {}
+    livre_ids = []
+    for element in elements:
+        livre_id = None
+        if isinstance(element, dict):
+            try:
+                livre_id = int(element['livre_id']) if element.get('livre_id') else par_isbn.get(str(element.get('isbn')))
+            except (TypeError, ValueError):
+                livre_id = None
+        livre_ids.append(livre_id)
+    return livre_ids
+
+
+def _resultat_lot(index, element, livre_id, **details):
+    """Résultat d'un élément du lot, avec l'identifiant scanné pour que le client s'y retrouve."""
+    resultat = {'index': index, 'livre_id': livre_id}
+    if isinstance(element, dict):
+        if livre_id is None and element.get('livre_id'):
+            resultat['livre_id'] = element['livre_id']
+        if element.get('isbn'):
+            resultat['isbn'] = element['isbn']
+    resultat.update(details)
+    return resultat
+
+
+@app.route("/api/circulation/lot", methods=['POST'])
+@login_required
+def circulation_lot():
+    if current_user.role != "admin":
+        return jsonify({'erreur': 'Accès non autorisé'}), 403
+
+    donnees = request.get_json(silent=True) or {}
+    if not isinstance(donnees, dict):
+        return jsonify({'erreur': 'Données invalides'}), 400
+    retours = donnees.get('retours') or []
+    emprunts_demandes = donnees.get('emprunts') or []
+    if not isinstance(retours, list) or not isinstance(emprunts_demandes, list):
+        return jsonify({'erreur': 'Données invalides'}), 400
+    if len(retours) + len(emprunts_demandes) > MAX_ELEMENTS_LOT:
+        return jsonify({'erreur': f'Maximum {MAX_ELEMENTS_LOT} éléments par lot'}), 400
+
+    resultats_retours = []
+    resultats_emprunts = []
+
+    try:
+        # Lectures et verrous d'abord : les dates posées ensuite restent proches du commit
+        livre_ids_retour = _resoudre_livres(retours)
+        livre_ids_emprunt = _resoudre_livres(emprunts_demandes)
+
+        ids_retour = {i for i in livre_ids_retour if i}
+        emprunts_ouverts = dict(db.session.query(Emprunt.livre_id, Emprunt.id).filter(
+            Emprunt.livre_id.in_(ids_retour),
+            Emprunt.date_retour_effective.is_(None)
+        ).with_for_update().all()) if ids_retour else {}
+
+        ids_emprunt = {i for i in livre_ids_emprunt if i}
+        livres_disponibles = {i for (i,) in db.session.query(Livre.id).filter(
+            Livre.id.in_(ids_emprunt), Livre.disponible == True
+        ).with_for_update().all()} if ids_emprunt else set()
+
+        adherent_ids = set()
+        for element in emprunts_demandes:
+            try:
+                adherent_ids.add(int(element['adherent_id']))
+            except (TypeError, ValueError, KeyError):
+                pass
+        adherents_connus = {i for (i,) in db.session.query(Adherent.id).filter(
+            Adherent.id.in_(adherent_ids)).all()} if adherent_ids else set()
+
+        maintenant = datetime.utcnow()
+
+        # Retours : traités d'abord, pour qu'un livre rendu puisse être réemprunté dans le même lot
+        a_retourner = {}
+        for index, (element, livre_id) in enumerate(zip(retours, livre_ids_retour)):
+            if livre_id is None:
+                resultats_retours.append(_resultat_lot(index, element, None, ok=False, erreur='Livre introuvable'))
+            elif livre_id in a_retourner:
+                resultats_retours.append(_resultat_lot(index, element, livre_id, ok=False, erreur='Déjà scanné dans ce lot'))
+            elif livre_id not in emprunts_ouverts:
+                resultats_retours.append(_resultat_lot(index, element, livre_id, ok=False, erreur='Aucun emprunt en cours'))
+            else:
+                a_retourner[livre_id] = emprunts_ouverts[livre_id]
+                resultats_retours.append(_resultat_lot(index, element, livre_id, ok=True,
+                                                       emprunt_id=emprunts_ouverts[livre_id]))
+        livres_disponibles |= ids_emprunt & set(a_retourner)
+
+        # Emprunts
+        nouveaux_emprunts = []
+        for index, (element, livre_id) in enumerate(zip(emprunts_demandes, livre_ids_emprunt)):
+            try:
+                adherent_id = int(element['adherent_id'])
+                date_retour_prevue = datetime.strptime(element['date_retour'], '%Y-%m-%d') \
+                    if element.get('date_retour') else maintenant + timedelta(days=14)
+            except (TypeError, ValueError, KeyError):
+                resultats_emprunts.append(_resultat_lot(index, element, livre_id, ok=False, erreur='Données invalides'))
+                continue
+
+            if livre_id is None:
+                resultats_emprunts.append(_resultat_lot(index, element, None, ok=False, erreur='Livre introuvable'))
+            elif adherent_id not in adherents_connus:
+                resultats_emprunts.append(_resultat_lot(index, element, livre_id, ok=False, erreur='Adhérent introuvable'))
+            elif livre_id not in livres_disponibles:
+                resultats_emprunts.append(_resultat_lot(index, element, livre_id, ok=False, erreur='Livre non disponible'))
+            else:
+                livres_disponibles.discard(livre_id)
+                nouveaux_emprunts.append({
+                    'adherent_id': adherent_id,
+                    'livre_id': livre_id,
+                    'date_emprunt': maintenant,
+                    'date_retour_prevue': date_retour_prevue,
+                    'status': 'en_cours',
+                    'prolongations': 0,
+                    'amende': 0.0
+                })
+                resultats_emprunts.append(_resultat_lot(
+                    index, element, livre_id, ok=True, adherent_id=adherent_id,
+                    date_retour_prevue=date_retour_prevue.strftime('%Y-%m-%d')
+                ))
+
+        if a_retourner:
+            Emprunt.query.filter(Emprunt.id.in_(a_retourner.values())).update(
+                {'status': 'retourne', 'date_retour_effective': maintenant}, synchronize_session=False)
+            Livre.query.filter(Livre.id.in_(a_retourner.keys())).update(
+                {'disponible': True, 'version': Livre.version + 1}, synchronize_session=False)
+
+        if nouveaux_emprunts:
+            db.session.execute(db.insert(Emprunt), nouveaux_emprunts)
+            Livre.query.filter(Livre.id.in_([e['livre_id'] for e in nouveaux_emprunts])).update(
+                {'disponible': False, 'version': Livre.version + 1}, synchronize_session=False)
+
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erreur': f'Erreur lors du traitement du lot: {str(e)}'}), 500
+
+    return jsonify({'retours': resultats_retours, 'emprunts': resultats_emprunts})
+
 @app.route("/dashboard/emprunts/retour/<int:emprunt_id>")
 @login_required
 def retourner_livre(emprunt_id):
@@ -472,6 +1124,235 @@ def retourner_livre(emprunt_id):
     return redirect(url_for('emprunts'))
 
 
+# STATISTIQUES - AGRÉGATS JOURNALIERS (TRAITEMENT INCRÉMENTAL)
+def _ajouter_stat(cumuls, jour, categorie, classe, champ, nombre):
+    cle = (jour, categorie or '', classe or '')
+    cumuls.setdefault(cle, {'emprunts': 0, 'retours': 0, 'retours_en_retard': 0})
+    cumuls[cle][champ] += nombre
+
+
+def _lignes_a_compter(type_ligne, colonne_date, borne):
+    """Emprunts dont la date est postérieure à la borne et pas encore comptés pour ce type."""
+    deja_compte = db.session.query(StatLigneComptee.emprunt_id).filter(
+        StatLigneComptee.type == type_ligne,
+        StatLigneComptee.emprunt_id == Emprunt.id
+    ).exists()
+    return db.session.query(
+        Emprunt.id, colonne_date, Emprunt.date_retour_prevue, Livre.categorie, Adherent.classe
+    ).join(Livre, Emprunt.livre_id == Livre.id) \
+     .outerjoin(Adherent, Emprunt.adherent_id == Adherent.id) \
+     .filter(colonne_date > borne, ~deja_compte).all()
+
+
+def mettre_a_jour_statistiques(seulement_si_perime=False):
+    """Ajoute aux agrégats journaliers les emprunts et retours apparus depuis le dernier passage.
+
+    Les dates sont posées avant le commit : une ligne datée juste avant un passage peut
+    n'être visible qu'après. Chaque passage relit donc la fenêtre STATS_MARGE précédant le
+    passage précédent, et les lignes déjà comptées dans cette fenêtre sont ignorées.
+    """
+    # Verrou sur le watermark : deux workers ne comptent jamais deux fois les mêmes lignes
+    watermark = StatWatermark.query.filter_by(nom='emprunts').with_for_update().first()
+    if watermark is None:
+        # Premier passage : deux workers peuvent tenter de créer la ligne en même temps
+        try:
+            db.session.add(StatWatermark(nom='emprunts', dernier_passage=datetime(1970, 1, 1),
+                                         updated_at=datetime(1970, 1, 1)))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        watermark = StatWatermark.query.filter_by(nom='emprunts').with_for_update().one()
+
+    if seulement_si_perime and watermark.updated_at \
+            and watermark.updated_at > datetime.utcnow() - app.config['STATS_INTERVALLE']:
+        # Un autre worker vient de faire le passage pendant qu'on attendait le verrou
+        db.session.commit()
+        return 0
+
+    debut_passage = datetime.utcnow()
+    marge = app.config['STATS_MARGE']
+    borne = watermark.dernier_passage - marge
+    # Les lignes plus anciennes que cette limite ne seront jamais relues
+    limite_memorisation = debut_passage - marge
+    cumuls = {}
+    comptees = []
+
+    for emprunt_id, date_emprunt, _, categorie, classe in _lignes_a_compter('emprunt', Emprunt.date_emprunt, borne):
+        _ajouter_stat(cumuls, date_emprunt.date(), categorie, classe, 'emprunts', 1)
+        if date_emprunt > limite_memorisation:
+            comptees.append({'type': 'emprunt', 'emprunt_id': emprunt_id, 'date': date_emprunt})
+
+    for emprunt_id, date_retour, date_prevue, categorie, classe in \
+            _lignes_a_compter('retour', Emprunt.date_retour_effective, borne):
+        _ajouter_stat(cumuls, date_retour.date(), categorie, classe, 'retours', 1)
+        if date_prevue and date_retour > date_prevue:
+            _ajouter_stat(cumuls, date_retour.date(), categorie, classe, 'retours_en_retard', 1)
+        if date_retour > limite_memorisation:
+            comptees.append({'type': 'retour', 'emprunt_id': emprunt_id, 'date': date_retour})
+
+    for (jour, categorie, classe), valeurs in cumuls.items():
+        stat = StatEmpruntJour.query.filter_by(jour=jour, categorie=categorie, classe=classe).first()
+        if stat is None:
+            stat = StatEmpruntJour(jour=jour, categorie=categorie, classe=classe,
+                                   emprunts=0, retours=0, retours_en_retard=0)
+            db.session.add(stat)
+        stat.emprunts += valeurs['emprunts']
+        stat.retours += valeurs['retours']
+        stat.retours_en_retard += valeurs['retours_en_retard']
+
+    StatLigneComptee.query.filter(StatLigneComptee.date <= limite_memorisation) \
+        .delete(synchronize_session=False)
+    if comptees:
+        db.session.execute(db.insert(StatLigneComptee), comptees)
+
+    watermark.dernier_passage = debut_passage
+    watermark.updated_at = datetime.utcnow()
+    db.session.commit()
+    return len(cumuls)
+
+
+@app.cli.command("stats-rollup")
+def stats_rollup_command():
+    """Met à jour les agrégats journaliers (à lancer périodiquement, ex. via cron)."""
+    nombre = mettre_a_jour_statistiques()
+    print(f"{nombre} agrégat(s) journalier(s) mis à jour")
+
+
+def _periode_demandee():
+    # Période par défaut : les 30 derniers jours
+    fin = datetime.utcnow().date()
+    debut = fin - timedelta(days=29)
+    try:
+        if request.args.get('debut'):
+            debut = datetime.strptime(request.args['debut'], '%Y-%m-%d').date()
+        if request.args.get('fin'):
+            fin = datetime.strptime(request.args['fin'], '%Y-%m-%d').date()
+    except ValueError:
+        return None, None
+    return debut, fin
+
+
+def serie_statistiques(debut, fin, categorie=None, classe=None):
+    """Série journalière (emprunts, retours, retards) lue uniquement dans les agrégats."""
+    query = db.session.query(
+        StatEmpruntJour.jour,
+        db.func.sum(StatEmpruntJour.emprunts),
+        db.func.sum(StatEmpruntJour.retours),
+        db.func.sum(StatEmpruntJour.retours_en_retard)
+    ).filter(StatEmpruntJour.jour >= debut, StatEmpruntJour.jour <= fin)
+
+    if categorie:
+        query = query.filter(StatEmpruntJour.categorie == categorie)
+    if classe:
+        query = query.filter(StatEmpruntJour.classe == classe)
+
+    lignes = query.group_by(StatEmpruntJour.jour).order_by(StatEmpruntJour.jour).all()
+    return [
+        {
+            'jour': jour.isoformat() if hasattr(jour, 'isoformat') else str(jour),
+            'emprunts': int(emprunts or 0),
+            'retours': int(retours or 0),
+            'retours_en_retard': int(retards or 0)
+        }
+        for jour, emprunts, retours, retards in lignes
+    ]
+
+
+@app.route("/api/statistiques/serie")
+@login_required
+def api_statistiques_serie():
+    debut, fin = _periode_demandee()
+    if debut is None or debut > fin:
+        return jsonify({'erreur': 'Période invalide'}), 400
+
+    serie = serie_statistiques(
+        debut, fin,
+        categorie=request.args.get('categorie'),
+        classe=request.args.get('classe')
+    )
+    return jsonify({'debut': debut.isoformat(), 'fin': fin.isoformat(), 'serie': serie})
+
+
+EXPORT_COLONNES = ['id', 'livre_id', 'titre', 'categorie', 'adherent_id', 'classe',
+                   'date_emprunt', 'date_retour_prevue', 'date_retour_effective',
+                   'status', 'prolongations', 'amende']
+
+
+def _lignes_export(taille_lot=1000):
+    # Parcours par lots de l'historique : rien n'est chargé entièrement en mémoire
+    query = db.session.query(
+        Emprunt.id, Emprunt.livre_id, Livre.titre, Livre.categorie,
+        Emprunt.adherent_id, Adherent.classe,
+        Emprunt.date_emprunt, Emprunt.date_retour_prevue, Emprunt.date_retour_effective,
+        Emprunt.status, Emprunt.prolongations, Emprunt.amende
+    ).join(Livre, Emprunt.livre_id == Livre.id) \
+     .outerjoin(Adherent, Emprunt.adherent_id == Adherent.id) \
+     .order_by(Emprunt.id) \
+     .execution_options(stream_results=True) \
+     .yield_per(taille_lot)
+
+    for ligne in query:
+        yield tuple(ligne)
+
+
+@app.route("/dashboard/statistiques/export")
+@login_required
+def export_statistiques():
+    if current_user.role != "admin":
+        flash("Accès non autorisé", "danger")
+        return redirect(url_for("dashboard"))
+
+    format_export = request.args.get('format', 'csv')
+
+    if format_export == 'parquet':
+        if pa is None:
+            flash("L'export Parquet nécessite pyarrow", "danger")
+            return redirect(url_for('statistiques'))
+
+        schema = pa.schema([
+            ('id', pa.int64()), ('livre_id', pa.int64()), ('titre', pa.string()),
+            ('categorie', pa.string()), ('adherent_id', pa.int64()), ('classe', pa.string()),
+            ('date_emprunt', pa.timestamp('us')), ('date_retour_prevue', pa.timestamp('us')),
+            ('date_retour_effective', pa.timestamp('us')), ('status', pa.string()),
+            ('prolongations', pa.int64()), ('amende', pa.float64())
+        ])
+
+        # Écriture par groupes de lignes dans un fichier temporaire, puis envoi
+        fichier = tempfile.TemporaryFile()
+        writer = pq.ParquetWriter(fichier, schema)
+        lot = []
+        for ligne in _lignes_export():
+            lot.append(ligne)
+            if len(lot) >= 1000:
+                writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_COLONNES, l)) for l in lot], schema=schema))
+                lot = []
+        if lot:
+            writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_COLONNES, l)) for l in lot], schema=schema))
+        writer.close()
+        fichier.seek(0)
+
+        return send_file(fichier, mimetype='application/vnd.apache.parquet',
+                         as_attachment=True, download_name='emprunts.parquet')
+
+    def generer_csv():
+        tampon = io.StringIO()
+        writer = csv.writer(tampon)
+        writer.writerow(EXPORT_COLONNES)
+        for ligne in _lignes_export():
+            writer.writerow(ligne)
+            if tampon.tell() > 64 * 1024:
+                yield tampon.getvalue()
+                tampon.seek(0)
+                tampon.truncate(0)
+        yield tampon.getvalue()
+
+    return Response(
+        stream_with_context(generer_csv()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=emprunts.csv'}
+    )
+
+
 @app.route("/dashboard/statistiques")
 @login_required
 def statistiques():
@@ -514,8 +1395,27 @@ def statistiques():
             'pourcentage': pourcentage
         })
     
+    # Série journalière servie depuis les agrégats ; le traitement incrémental
+    # (flask stats-rollup) n'est relancé ici que s'il n'a pas tourné récemment
+    watermark = db.session.get(StatWatermark, 'emprunts')
+    if watermark is None or watermark.updated_at is None \
+            or watermark.updated_at < datetime.utcnow() - app.config['STATS_INTERVALLE']:
+        mettre_a_jour_statistiques(seulement_si_perime=True)
+    debut, fin = _periode_demandee()
+    if debut is None or debut > fin:
+        flash("Période invalide", "danger")
+        fin = datetime.utcnow().date()
+        debut = fin - timedelta(days=29)
+    serie = serie_statistiques(debut, fin)
+    max_serie = max([max(j['emprunts'], j['retours']) for j in serie]) if serie else 0
+
     return render_template("statistiques.html", 
                          title="Statistiques",
+                         serie=serie,
+                         max_serie=max_serie or 1,
+                         debut=debut,
+                         fin=fin,
+                         export_parquet=pa is not None,
                          total_adherents=total_adherents,
                          total_livres=total_livres,
                          emprunts_en_cours=emprunts_en_cours,
@@ -0,0 +1,59 @@
+"""Statistiques journalières des emprunts
+
+Revision ID: a1c4e7d2b903
+Revises: 49f3c9f85412
+Create Date: 2026-10-19 09:12:40.512331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c4e7d2b903'
+down_revision = '49f3c9f85412'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stat_emprunt_jour',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jour', sa.Date(), nullable=False),
+        sa.Column('categorie', sa.String(length=50), nullable=False),
+        sa.Column('classe', sa.String(length=50), nullable=False),
+        sa.Column('emprunts', sa.Integer(), nullable=False),
+        sa.Column('retours', sa.Integer(), nullable=False),
+        sa.Column('retours_en_retard', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('jour', 'categorie', 'classe', name='uq_stat_jour')
+    )
+    with op.batch_alter_table('stat_emprunt_jour', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stat_emprunt_jour_jour'), ['jour'], unique=False)
+
+    op.create_table('stat_watermark',
+        sa.Column('nom', sa.String(length=50), nullable=False),
+        sa.Column('dernier_passage', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('nom')
+    )
+    op.create_table('stat_ligne_comptee',
+        sa.Column('type', sa.String(length=10), nullable=False),
+        sa.Column('emprunt_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('type', 'emprunt_id')
+    )
+    with op.batch_alter_table('stat_ligne_comptee', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stat_ligne_comptee_date'), ['date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stat_ligne_comptee', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stat_ligne_comptee_date'))
+
+    op.drop_table('stat_ligne_comptee')
+    op.drop_table('stat_watermark')
+    with op.batch_alter_table('stat_emprunt_jour', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stat_emprunt_jour_jour'))
+
+    op.drop_table('stat_emprunt_jour')
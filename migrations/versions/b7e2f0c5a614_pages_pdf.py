@@ -0,0 +1,39 @@
+"""Texte des PDF indexé par page
+
+Revision ID: b7e2f0c5a614
+Revises: a1c4e7d2b903
+Create Date: 2026-10-19 10:03:27.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f0c5a614'
+down_revision = 'a1c4e7d2b903'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('page_pdf',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('livre_id', sa.Integer(), nullable=False),
+        sa.Column('page', sa.Integer(), nullable=False),
+        sa.Column('texte', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['livre_id'], ['livre.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('livre_id', 'page', name='uq_page_pdf')
+    )
+    with op.batch_alter_table('page_pdf', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_page_pdf_livre_id'), ['livre_id'], unique=False)
+        batch_op.create_index('ix_page_pdf_texte', ['texte'], unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    with op.batch_alter_table('page_pdf', schema=None) as batch_op:
+        batch_op.drop_index('ix_page_pdf_texte')
+        batch_op.drop_index(batch_op.f('ix_page_pdf_livre_id'))
+
+    op.drop_table('page_pdf')
@@ -0,0 +1,26 @@
+"""Version des livres
+
+Revision ID: c3d9a8e1f275
+Revises: b7e2f0c5a614
+Create Date: 2026-10-19 11:21:05.377460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d9a8e1f275'
+down_revision = 'b7e2f0c5a614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('livre', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('livre', schema=None) as batch_op:
+        batch_op.drop_column('version')
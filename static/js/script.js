@@ -1,4 +1,4 @@
-/* main scripts consolidated: progress bars, login toggle, sidebar preservation, animated title */
+/* main scripts consolidated: progress bars, login toggle, sidebar preservation, search suggestions, animated title */
 document.addEventListener('DOMContentLoaded', function () {
     // --- Progress bars (statistiques) ---
     setTimeout(() => {
@@ -51,6 +51,69 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    // --- Search suggestions (catalogue), debounced calls to /api/suggest ---
+    const suggestInput = document.querySelector('[data-suggest-url]');
+    const suggestBox = document.getElementById('searchSuggestions');
+    if (suggestInput && suggestBox) {
+        let debounceTimer = null;
+        let lastQuery = '';
+
+        const hideSuggestions = () => {
+            suggestBox.classList.add('d-none');
+            suggestBox.innerHTML = '';
+        };
+
+        const showSuggestions = (livres) => {
+            suggestBox.innerHTML = '';
+            if (livres.length === 0) {
+                hideSuggestions();
+                return;
+            }
+            livres.forEach(livre => {
+                const item = document.createElement('a');
+                item.className = 'list-group-item list-group-item-action';
+                item.href = suggestInput.dataset.catalogueUrl + '?recherche=' + encodeURIComponent(livre.titre);
+                const titre = document.createElement('div');
+                titre.className = 'fw-semibold';
+                titre.textContent = livre.titre;
+                const details = document.createElement('small');
+                details.className = 'text-muted';
+                details.textContent = livre.auteur + (livre.isbn ? ' · ' + livre.isbn : '');
+                item.append(titre, details);
+                suggestBox.appendChild(item);
+            });
+            suggestBox.classList.remove('d-none');
+        };
+
+        suggestInput.addEventListener('input', function () {
+            clearTimeout(debounceTimer);
+            const query = this.value.trim();
+            if (query.length < 2) {
+                lastQuery = '';
+                hideSuggestions();
+                return;
+            }
+            // wait for the user to pause typing before querying the server
+            debounceTimer = setTimeout(() => {
+                if (query === lastQuery) return;
+                lastQuery = query;
+                fetch(suggestInput.dataset.suggestUrl + '?q=' + encodeURIComponent(query))
+                    .then(response => response.json())
+                    .then(livres => {
+                        // ignore answers to an outdated query
+                        if (query === lastQuery) showSuggestions(livres);
+                    })
+                    .catch(hideSuggestions);
+            }, 200);
+        });
+
+        document.addEventListener('click', function (event) {
+            if (!suggestBox.contains(event.target) && event.target !== suggestInput) {
+                hideSuggestions();
+            }
+        });
+    }
+
     // --- Animated hero title (phrases rotate) ---
     const animated = document.getElementById('animated-title');
     if (animated) {